@@ -0,0 +1,37 @@
+"""
+Persist the calibrated ambient-noise threshold between runs
+(shared by the app and the diagnostic scripts)
+"""
+
+import os
+import json
+
+CACHE_PATH = os.path.expanduser("~/.cache/speech_rec/ambient.json")
+
+
+def load_ambient(recognizer):
+    """Seed the recognizer from the saved threshold; returns True if one was found."""
+    try:
+        with open(CACHE_PATH) as f:
+            cached = json.load(f)
+        recognizer.energy_threshold = float(cached["energy_threshold"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    # A seeded threshold keeps adapting, so a short calibration converges quickly
+    recognizer.dynamic_energy_threshold = True
+    recognizer.dynamic_energy_adjustment_damping = 0.15
+    return True
+
+
+def save_ambient(recognizer):
+    """Save the recognizer's calibrated threshold for the next run."""
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, "w") as f:
+            json.dump({
+                "energy_threshold": recognizer.energy_threshold,
+                "dynamic_energy_threshold": recognizer.dynamic_energy_threshold,
+            }, f)
+    except OSError:
+        pass  # the cache is only an optimisation
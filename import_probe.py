@@ -0,0 +1,37 @@
+"""
+Parallel, cached import probing shared by the diagnostic scripts
+"""
+
+import sys
+import importlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Import results keyed by module name: None on success, otherwise the ImportError
+_import_cache = {}
+
+
+def try_import(module):
+    """Import a module once, skipping the full import if it cannot be found."""
+    if module not in _import_cache:
+        try:
+            if importlib.util.find_spec(module) is None:
+                raise ImportError(f"No module named '{module}'")
+            importlib.import_module(module)
+            _import_cache[module] = None
+        except ImportError as e:
+            _import_cache[module] = e
+    return _import_cache[module]
+
+
+def probe_imports(modules):
+    """Import modules in parallel; returns {module: ImportError or None}."""
+    # Imports are mostly disk I/O and extension loading, so overlap them
+    with ThreadPoolExecutor(max_workers=len(modules)) as pool:
+        futures = {pool.submit(try_import, module): module for module in modules}
+        return {futures[f]: f.result() for f in as_completed(futures)}
+
+
+def optional_module(module):
+    """Return the module if it imports, otherwise None."""
+    return sys.modules.get(module) if try_import(module) is None else None
@@ -6,5 +6,8 @@
 export ALSA_CARD=Generic
 export ALSA_PCM_CARD=Generic
 
-# Run the application with stderr filtered to remove ALSA warnings
-python speech_recognition_app.py 2>&1 | grep -v "ALSA lib"
+# Let the app point stderr at /dev/null once at startup, so ALSA warnings
+# never reach the terminal (piping through grep would break the TUI)
+export SUPPRESS_ALSA=1
+
+python speech_recognition_app.py
@@ -3,10 +3,11 @@ from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal, Vertical, ScrollableContainer
 from textual.widgets import Header, Footer, Button, Static, RichLog, Label
 from textual.binding import Binding
-from textual.message import Message
 from textual import events
-from datetime import datetime
+from rich.markup import escape
 import threading
+import time
+import wave
 import queue
 import sys
 import subprocess
@@ -15,12 +16,28 @@ import warnings
 from ctypes import *
 import asyncio
 import json
+import collections
+import concurrent.futures
+import contextlib
+from functools import lru_cache
+import math
+import numpy as np
+
+from ambient_cache import load_ambient, save_ambient
 
 # Suppress ALSA warnings more aggressively for Anaconda environments
 import os
 os.environ['PYTHONWARNINGS'] = 'ignore'
 os.environ['ALSA_CARD'] = 'Generic_1'  # Use the ALC294 card
 
+# With SUPPRESS_ALSA=1, send fd 2 to /dev/null once so the kernel drops ALSA
+# chatter written by C code. Textual draws on sys.__stderr__, so keep a copy of
+# the terminal's fd and point the Python-level stderr streams at it first.
+if os.environ.get('SUPPRESS_ALSA') == '1':
+    sys.stderr.flush()
+    sys.__stderr__ = sys.stderr = os.fdopen(os.dup(2), 'w', buffering=1)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 2)
+
 # Try to suppress ALSA errors
 try:
     # Try to load ALSA library and suppress errors
@@ -44,10 +61,13 @@ except:
     pass
 
 # Redirect stderr to suppress ALSA messages
+_ALSA_NEEDLES = (b'ALSA', b'alsa', b'pcm', b'dlmisc')
+
 class SuppressStream:
     def write(self, data):
         # Suppress ALSA error messages
-        if not any(x in str(data) for x in ['ALSA', 'alsa', 'pcm', 'dlmisc']):
+        raw = data.encode('utf-8', 'ignore') if isinstance(data, str) else data
+        if not any(needle in raw for needle in _ALSA_NEEDLES):
             sys.__stderr__.write(data)
     def flush(self):
         pass
@@ -63,6 +83,31 @@ try:
 except ImportError:
     OLLAMA_AVAILABLE = False
 
+# Try to import orjson for faster config parsing
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Try to import vosk for local streaming recognition
+try:
+    import vosk
+    vosk.SetLogLevel(-1)
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
+# Try to import webrtcvad for frame-level voice activity detection
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+# Sample rates the WebRTC VAD accepts (frames must be 10, 20 or 30 ms)
+WEBRTCVAD_RATES = (8000, 16000, 32000, 48000)
+
 # TTS removed - not needed
 
 # Restore stderr after imports
@@ -77,28 +122,96 @@ os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 # Removed espeak check - TTS not needed
 
 
-class UpdateLog(Message):
-    """Message to update logs from threads."""
-    def __init__(self, log_type: str, text: str, is_error: bool = False):
-        super().__init__()
-        self.log_type = log_type
-        self.text = text
-        self.is_error = is_error
-
-
-class UpdateStatus(Message):
-    """Message to update status from threads."""
-    def __init__(self, message: str, status_class: str = "status-ready"):
-        super().__init__()
-        self.message = message
-        self.status_class = status_class
-
-
-class UpdateAudioLevel(Message):
-    """Message to update audio level indicator."""
-    def __init__(self, level: int):
-        super().__init__()
-        self.level = level  # 0-10 scale
+@lru_cache(maxsize=32)
+def _short_mic_name(name: str) -> str:
+    """Shorten a PortAudio device name for display (the mic list is small and stable)."""
+    return name.split(':')[-1].strip() if ':' in name else name
+
+
+# A detected input device, classified once at detection time
+MicInfo = collections.namedtuple("MicInfo", "index name short_name is_preferred")
+
+
+class CaptureJob:
+    """A request for the frame consumer thread: calibrate, or capture one utterance."""
+    def __init__(self, kind: str, duration: float = 0.5, timeout: float = None,
+                 phrase_time_limit: float = None, frame_duration: float = 0.01,
+                 pre_roll: float = 0.5, continuous: bool = False):
+        self.kind = kind  # "calibrate" or "listen"
+        self.continuous = continuous  # keep capturing utterances until detached
+        self.duration = duration
+        self.timeout = timeout
+        self.phrase_time_limit = phrase_time_limit
+        self.future = concurrent.futures.Future()
+        self.loop = None  # event loop to notify, set by _submit_capture
+
+        self.elapsed = 0.0
+        self.phrase_start = 0.0  # elapsed time when the current phrase started
+        self.speaking = False
+        self.silent_frames = 0
+        self.voiced_frames = 0  # frames with speech since the phrase started
+        self.pre_roll_frames = int(math.ceil(pre_roll / frame_duration))
+        # Sized up front for the longest phrase so appends never grow the buffer
+        max_frames = int(math.ceil((phrase_time_limit or 60) / frame_duration)) + self.pre_roll_frames
+        self.utterance = collections.deque(maxlen=max_frames)
+        # Recent VAD decisions (200 ms) used to confirm the start of speech
+        self.voiced = collections.deque(maxlen=int(math.ceil(0.2 / frame_duration)))
+
+        # Optional streaming recognizer (Vosk) fed while recording. Only the consumer
+        # thread touches it; other threads post a replacement in pending_streaming.
+        self.streaming = None
+        self.pending_streaming = None  # (recognizer or None,) from request_streaming()
+        self._applied_streaming = None
+        self.segments = []
+        self.last_partial = ""
+
+    def result(self, microphone):
+        """Return (audio, text) and reset for the next utterance.
+
+        ``text`` is None when no streaming recognizer was used.
+        """
+        audio = sr.AudioData(b"".join(self.utterance), microphone.SAMPLE_RATE, microphone.SAMPLE_WIDTH)
+        text = None
+        streaming = self.streaming
+        if streaming is not None:
+            # FinalResult() also resets the recognizer
+            final = json.loads(streaming.FinalResult()).get("text", "")
+            text = " ".join(self.segments + [final] if final else self.segments)
+
+        self.elapsed = 0.0
+        self._reset_phrase()
+        self.utterance.clear()
+        return audio, text
+
+    def request_streaming(self, recognizer):
+        """Ask for a different streaming recognizer from the next phrase on (any thread)."""
+        self.pending_streaming = (recognizer,)
+
+    def apply_pending_streaming(self):
+        """Switch to a requested recognizer; the consumer calls this between phrases."""
+        pending = self.pending_streaming
+        if pending is not None and pending is not self._applied_streaming:
+            self._applied_streaming = pending
+            self.streaming = pending[0]
+
+    def discard(self, keep_frames: int):
+        """Drop a phrase that was too short (a click or pop) and wait for speech again."""
+        streaming = self.streaming
+        if streaming is not None:
+            streaming.FinalResult()  # resets the recognizer
+        self._reset_phrase()
+        while len(self.utterance) > keep_frames:
+            self.utterance.popleft()
+
+    def _reset_phrase(self):
+        """Reset the per-phrase VAD and streaming state."""
+        self.phrase_start = 0.0
+        self.speaking = False
+        self.silent_frames = 0
+        self.voiced_frames = 0
+        self.voiced.clear()
+        self.segments = []
+        self.last_partial = ""
 
 
 class SpeechRecognitionApp(App):
@@ -190,6 +303,11 @@ class SpeechRecognitionApp(App):
         height: 1fr;
     }
 
+    #ollama-partial {
+        height: auto;
+        padding: 0 1;
+    }
+
     .timestamp {
         color: $accent;
     }
@@ -214,6 +332,7 @@ class SpeechRecognitionApp(App):
         ("m", "cycle_microphone", "Cycle Mic"),
         ("g", "toggle_language", "Toggle Lang"),
         ("d", "toggle_debug", "Toggle Debug"),
+        ("r", "recalibrate", "Recalibrate"),
     ]
 
     def __init__(self):
@@ -230,28 +349,65 @@ class SpeechRecognitionApp(App):
             "en-US": "English"
         }
         self.language = "id-ID"  # Default: Bahasa Indonesia
-        self.mic_lock = threading.Lock()
+        self._lang_name = self.languages[self.language]
+        self.mic_lock = asyncio.Lock()  # held by listen/calibrate workers
         
         # Anaconda-specific settings
         self.available_mics = []
         self.selected_mic_index = None
+        self._mic_short_name = "Not Set"
         self.sample_rate = 44100  # Default for ALC294
         self.debug_mode = False
+
+        # Streaming capture settings
+        self.frame_duration = 0.01  # 10 ms PCM frames per callback keep capture latency low
+        self._pcm_q = queue.SimpleQueue()
+        self._capture = None  # (PyAudio, stream) kept open across listens
+        self._capture_job = None  # CaptureJob being served by the consumer thread
+        self._utterances = queue.SimpleQueue()  # finished utterances in continuous mode
+        self.utterance_ready_event = asyncio.Event()
+        self.unrecognized_count = 0  # consecutive UnknownValueError results
+        self.recalibrate_after = 3
+        # A threshold seeded from the last run only needs a short settle at startup
+        self.calibrate_duration = 0.2 if load_ambient(self.recognizer) else 0.5
+        self.vosk_model = None
+        self.vosk_language = None  # language the Vosk model recognizes
+        # WebRTC VAD replaces the energy threshold when the mic rate allows it
+        self.vad = webrtcvad.Vad(2) if WEBRTCVAD_AVAILABLE else None
+        self._use_vad = False
+        self.vad_pause_threshold = 0.3  # a real VAD can end utterances sooner
         
         # Ollama settings
         self.ollama_enabled = OLLAMA_AVAILABLE
+        self._ollama_status_str = "ON" if OLLAMA_AVAILABLE else "N/A"
         self.ollama_model = "qwen3:8b"
-        self.conversation_history = []
+        self.ollama_client = ollama.AsyncClient() if OLLAMA_AVAILABLE else None
+        self._system_prompt = None
+        self.conversation_history = collections.deque(maxlen=10)  # oldest turns are evicted
         self.llm_config = {}
 
         # Audio visualization
         self.audio_level = 0
         self.is_listening = False
 
+        # Batched UI updates, flushed once per frame
+        self._pending_updates = {"logs": []}
+        self._pending_lock = threading.Lock()
+
+        # Log timestamp cache: (epoch second, formatted HH:MM:SS)
+        self._ts_cache = (0, "")
+
+        # Streamed Ollama reply not yet written to the log
+        self._ollama_partial = ""
+        self._ollama_reply_started = False
+        self._ollama_lock = asyncio.Lock()
+
         # Continuous listening mode
         self.continuous_mode = False
         self.l_key_pressed = False
-        self.listening_thread = None
+        self.listening_worker = None
+
+        self._refresh_status_suffix()
 
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
@@ -271,9 +427,7 @@ class SpeechRecognitionApp(App):
             yield Label("Audio Level: [░░░░░░░░░░░░░░░░░░░░]", id="audio-bar", classes="status-ready")
 
         with Container(id="status-panel"):
-            ollama_status = "ON" if self.ollama_enabled else "OFF" if OLLAMA_AVAILABLE else "N/A"
-            lang_name = self.languages.get(self.language, self.language)
-            yield Label(f"Status: Ready | Lang: {lang_name} | Ollama: {ollama_status} | Mic: Not Set",
+            yield Label(f"Status: Ready{self._status_suffix}",
                        id="status-label", classes="status-ready")
 
         with Container(id="info-panel"):
@@ -288,56 +442,66 @@ class SpeechRecognitionApp(App):
             with Container(id="ollama-panel"):
                 yield Static("Ollama AI Response:", classes="title")
                 yield RichLog(id="ollama-log", highlight=True, markup=True)
+                yield Label("", id="ollama-partial")  # line still being generated
 
         yield Footer()
 
     def detect_microphones(self):
         """Detect available microphones with Anaconda-specific handling."""
-        # Suppress ALSA errors during detection
-        old_stderr = sys.stderr
-        sys.stderr = SuppressStream()
-        
         try:
             self.available_mics = []
             mic_list = sr.Microphone.list_microphone_names()
             
-            # Filter and prioritize microphones
+            # Classify each device once: lowercase name, HDMI filter, ALC294/analog preference
+            all_mics = []
             for idx, name in enumerate(mic_list):
+                lower = name.lower()
+                is_analog = 'analog' in lower
+                mic = MicInfo(idx, name, _short_mic_name(name), is_analog or 'alc294' in lower)
+                all_mics.append(mic)
+
                 # Skip HDMI devices and prefer analog
-                if 'hdmi' in name.lower() and 'analog' not in name.lower():
-                    continue
-                    
-                # Prioritize ALC294 Analog
-                if 'alc294' in name.lower() or 'analog' in name.lower():
-                    self.available_mics.insert(0, (idx, name))
-                else:
-                    self.available_mics.append((idx, name))
-            
+                if 'hdmi' not in lower or is_analog:
+                    self.available_mics.append(mic)
+
             # If no mics after filtering, add all
             if not self.available_mics:
-                self.available_mics = [(i, n) for i, n in enumerate(mic_list)]
+                self.available_mics = all_mics
+
+            # Prioritize ALC294 Analog (stable sort keeps device order otherwise)
+            self.available_mics.sort(key=lambda mic: not mic.is_preferred)
             
             return True
             
         except Exception as e:
-            self.post_message(UpdateLog("info", f"Microphone detection error: {str(e)}", True))
+            self._enqueue_update(log=("info", f"Microphone detection error: {str(e)}", True))
             return False
+
+    def _default_sample_rate(self, device_index=None):
+        """Ask PortAudio for the native sample rate of an input device."""
+        audio = sr.Microphone.get_pyaudio().PyAudio()
+        try:
+            if device_index is None:
+                info = audio.get_default_input_device_info()
+            else:
+                info = audio.get_device_info_by_index(device_index)
+            return int(info["defaultSampleRate"])
         finally:
-            sys.stderr = old_stderr
+            audio.terminate()
 
     def initialize_microphone(self, device_index=None):
         """Initialize microphone with Anaconda-specific error handling."""
-        old_stderr = sys.stderr
-        sys.stderr = SuppressStream()
-        
         try:
-            # Try different configurations
-            configs = [
-                (device_index, 44100),
-                (device_index, 48000),
-                (device_index, 16000),
-                (device_index, None),  # Let system choose
-            ]
+            # Use the rate the device advertises; only try a cascade if it can't be queried
+            try:
+                configs = [(device_index, self._default_sample_rate(device_index))]
+            except Exception:
+                configs = [
+                    (device_index, 44100),
+                    (device_index, 48000),
+                    (device_index, 16000),
+                    (device_index, None),  # Let system choose
+                ]
             
             for dev_idx, rate in configs:
                 try:
@@ -349,12 +513,29 @@ class SpeechRecognitionApp(App):
                     else:
                         self.microphone = sr.Microphone(device_index=dev_idx)
                     
-                    # Test the microphone
-                    with self.microphone as source:
-                        self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    
+                    # Opening the capture stream tests the microphone; it stays open
+                    # for all following listens
+                    self.open_microphone_stream()
+
                     self.sample_rate = rate or "auto"
                     self.selected_mic_index = dev_idx
+                    self._mic_short_name = next(
+                        (mic.short_name for mic in self.available_mics if mic.index == dev_idx),
+                        "Not Set",
+                    )
+                    self._refresh_status_suffix()
+
+                    self._use_vad = (self.vad is not None
+                                     and self.microphone.SAMPLE_RATE in WEBRTCVAD_RATES)
+                    if self._use_vad:
+                        # The VAD classifies each frame itself; there is nothing to calibrate
+                        self._enqueue_update(log=("transcript", "✓ Using WebRTC VAD"))
+                    else:
+                        # Calibrate from the open stream without blocking startup
+                        self.run_worker(
+                            self._recalibrate_task(self.calibrate_duration),
+                            name="recalibrate", group="listen",
+                        )
                     return True
                     
                 except:
@@ -363,25 +544,27 @@ class SpeechRecognitionApp(App):
             return False
             
         except Exception as e:
-            self.post_message(UpdateLog("info", f"Mic init error: {str(e)}", True))
+            self._enqueue_update(log=("info", f"Mic init error: {str(e)}", True))
             return False
-        finally:
-            sys.stderr = old_stderr
 
-    def load_llm_prompt_config(self, config_path="prompt_llm_SR.json"):
-        """Loads LLM prompt configuration from a JSON file."""
+    @staticmethod
+    def _read_config_bytes(config_path):
+        """Read the raw bytes of a config file."""
+        with open(config_path, 'rb') as f:
+            return f.read()
+
+    async def load_llm_prompt_config(self, config_path="prompt_llm_SR.json"):
+        """Loads LLM prompt configuration from a JSON file without blocking the UI."""
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                self.llm_config = json.load(f)
+            data = await asyncio.to_thread(self._read_config_bytes, config_path)
+            self.llm_config = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
 
             self.language = self.llm_config.get("default_language", self.language)
+            self._lang_name = self.languages.get(self.language, self.language)
+            self._refresh_status_suffix()
             self.ollama_model = self.llm_config.get("model", self.ollama_model)
 
-            if self.llm_config.get("system_prompt"):
-                self.conversation_history = [{
-                    "role": "system",
-                    "content": self.llm_config["system_prompt"]
-                }]
+            self._system_prompt = self.llm_config.get("system_prompt") or None
 
             self.add_transcript(f"✓ LLM config loaded from '{config_path}'")
 
@@ -390,8 +573,37 @@ class SpeechRecognitionApp(App):
         except Exception as e:
             self.add_transcript(f"✗ Error loading LLM config: {e}", is_error=True)
 
+        # The config may name a Vosk model; it takes a few seconds to load, Google is used until then
+        await asyncio.to_thread(self.load_vosk_model)
+
+    def load_vosk_model(self):
+        """Load a local Vosk model for streaming recognition, if configured."""
+        model_path = os.environ.get("VOSK_MODEL_PATH") or self.llm_config.get("vosk_model_path")
+        if not VOSK_AVAILABLE or not model_path:
+            return
+
+        try:
+            self.vosk_model = vosk.Model(model_path)
+            # A model knows one language; assume the startup language unless told otherwise
+            self.vosk_language = (os.environ.get("VOSK_LANGUAGE")
+                                  or self.llm_config.get("vosk_language", self.language))
+            self._enqueue_update(log=("transcript",
+                f"✓ Vosk model ({self.vosk_language}) loaded from '{model_path}'"))
+        except Exception as e:
+            self._enqueue_update(log=("transcript", f"✗ Error loading Vosk model: {e}", True))
+
     def on_mount(self) -> None:
         """Initialize on mount with better Anaconda handling."""
+        # Keep direct references to the widgets updated on every frame
+        self._audio_bar = self.query_one("#audio-bar", Label)
+        self._status_label = self.query_one("#status-label", Label)
+        self._info_label = self.query_one("#info-label", Label)
+        self._transcript_log = self.query_one("#transcript-log", RichLog)
+        self._ollama_log = self.query_one("#ollama-log", RichLog)
+        self._ollama_partial_label = self.query_one("#ollama-partial", Label)
+        self._btn_ollama = self.query_one("#btn-ollama", Button) if OLLAMA_AVAILABLE else None
+        self._btn_lang = self.query_one("#btn-lang", Button)
+
         info_text = []
         
         # Detect Python environment
@@ -404,23 +616,20 @@ class SpeechRecognitionApp(App):
             
             # Try to initialize with the first (preferred) microphone
             if self.available_mics:
-                mic_idx, mic_name = self.available_mics[0]
-                
-                # Shorten the mic name for display
-                short_name = mic_name.split(':')[-1].strip() if ':' in mic_name else mic_name
+                mic_idx, _, short_name, _ = self.available_mics[0]
                 info_text.append(f"Trying: {short_name}")
                 
                 if self.initialize_microphone(mic_idx):
                     self.microphone_error = None
                     info_text.append(f"✓ Using: {short_name} @ {self.sample_rate}Hz")
-                    self.post_message(UpdateStatus(
+                    self._enqueue_update(status=(
                         f"Ready | Mic: {short_name}", 
                         "status-ready"
                     ))
                 else:
                     self.microphone_error = "Failed to initialize microphone"
                     info_text.append("✗ Microphone initialization failed")
-                    self.post_message(UpdateStatus("Error: Mic init failed", "status-error"))
+                    self._enqueue_update(status=("Error: Mic init failed", "status-error"))
             else:
                 self.microphone_error = "No microphones available"
                 info_text.append("✗ No microphones found")
@@ -428,35 +637,71 @@ class SpeechRecognitionApp(App):
             self.microphone_error = "Microphone detection failed"
             info_text.append("✗ Could not detect microphones")
         
+        # Apply queued UI updates once per frame instead of once per message
+        self.set_interval(1 / 60, self._flush_updates)
+
         # Update info panel
-        info_label = self.query_one("#info-label", Label)
-        info_label.update(" | ".join(info_text))
+        self._info_label.update(" | ".join(info_text))
 
         # Show installation warnings
         if not OLLAMA_AVAILABLE:
             self.add_transcript("ℹ Ollama not installed. Install with: pip install ollama")
 
-        self.load_llm_prompt_config()
-
-    def on_update_log(self, message: UpdateLog) -> None:
-        """Handle log update messages from threads."""
-        if message.log_type == "info":
-            info_label = self.query_one("#info-label", Label)
-            current = info_label.renderable
-            info_label.update(f"{current} | {message.text}")
-        elif message.log_type == "transcript":
-            self.add_transcript(message.text, message.is_error)
-        elif message.log_type == "ollama":
-            self.add_ollama_response(message.text, message.is_error)
-
-    def on_update_status(self, message: UpdateStatus) -> None:
-        """Handle status update messages from threads."""
-        self.update_status(message.message, message.status_class)
-
-    def on_update_audio_level(self, message: UpdateAudioLevel) -> None:
-        """Handle audio level update messages from threads."""
-        self.audio_level = message.level
-        self.update_audio_bar()
+        self.run_worker(self.load_llm_prompt_config(), name="config", group="config", exclusive=True)
+
+    def _enqueue_update(self, audio_level=None, status=None, log=None):
+        """Queue a UI update from any thread; applied by the next frame flush."""
+        with self._pending_lock:
+            if audio_level is not None:
+                # Only the latest level matters
+                self._pending_updates["audio_level"] = audio_level
+            if status is not None:
+                self._pending_updates["status"] = status
+            if log is not None:
+                if len(log) == 2:
+                    log = (*log, False)
+                self._pending_updates["logs"].append(log)
+
+    def _flush_updates(self) -> None:
+        """Apply all queued UI updates at once (runs at ~60 fps)."""
+        with self._pending_lock:
+            updates = self._pending_updates
+            if len(updates) == 1 and not updates["logs"]:
+                return
+            self._pending_updates = {"logs": []}
+
+        if "audio_level" in updates:
+            self.audio_level = updates["audio_level"]
+            self.update_audio_bar()
+
+        if "status" in updates:
+            self.update_status(*updates["status"])
+
+        info, transcript, ollama_lines = [], [], []
+        ollama_streamed = False
+        for log_type, text, is_error in updates["logs"]:
+            if log_type == "info":
+                info.append(text)
+            elif log_type == "transcript":
+                transcript.append(self.format_transcript(text, is_error))
+            elif log_type == "ollama":
+                ollama_lines.append(self.format_ollama_response(text, is_error))
+            elif log_type == "ollama_delta":
+                ollama_lines.extend(self._take_ollama_lines(text))
+                ollama_streamed = True
+            elif log_type == "ollama_end":
+                ollama_lines.extend(self._take_ollama_lines(text, final=True))
+                ollama_streamed = True
+
+        if info:
+            current = self._info_label.renderable
+            self._info_label.update(f"{current} | " + " | ".join(info))
+        if transcript:
+            self._transcript_log.write("\n".join(transcript))
+        if ollama_lines:
+            self._ollama_log.write("\n".join(ollama_lines))
+        if ollama_streamed:
+            self._ollama_partial_label.update(self._format_ollama_partial())
 
     def on_key(self, event: events.Key) -> None:
         """Handle key press for continuous listening."""
@@ -480,11 +725,12 @@ class SpeechRecognitionApp(App):
         """Stop continuous listening mode."""
         self.continuous_mode = False
         self.l_key_pressed = False
-        self.post_message(UpdateStatus("Ready - Stopped listening", "status-ready"))
+        self.utterance_ready_event.set()  # wake the listening loop so it can exit
+        self._enqueue_update(status=("Ready - Stopped listening", "status-ready"))
 
     def update_audio_bar(self):
         """Update the audio level visualization bar."""
-        audio_bar = self.query_one("#audio-bar", Label)
+        audio_bar = self._audio_bar
 
         # Create visual bar based on audio level (0-20 blocks)
         bar_length = 20
@@ -503,87 +749,112 @@ class SpeechRecognitionApp(App):
             audio_bar.remove_class("status-listening", "status-error")
             audio_bar.add_class("status-ready")
 
+    def _refresh_status_suffix(self):
+        """Rebuild the status bar suffix; call after changing language, Ollama state or mic."""
+        self._status_suffix = (
+            f" | Lang: {self._lang_name} | Ollama: {self._ollama_status_str} | Mic: {self._mic_short_name}"
+        )
+
     def update_status(self, message: str, status_class: str = "status-ready"):
         """Update the status label."""
-        status_label = self.query_one("#status-label", Label)
-
-        # Add language and Ollama status
-        lang_name = self.languages.get(self.language, self.language)
-        ollama_status = "ON" if self.ollama_enabled else "OFF" if OLLAMA_AVAILABLE else "N/A"
-
-        # Add mic info if available
-        if self.selected_mic_index is not None and self.available_mics:
-            for idx, name in self.available_mics:
-                if idx == self.selected_mic_index:
-                    short_name = name.split(':')[-1].strip() if ':' in name else name
-                    status_text = f"{message} | Lang: {lang_name} | Ollama: {ollama_status} | Mic: {short_name}"
-                    break
-        else:
-            status_text = f"{message} | Lang: {lang_name} | Ollama: {ollama_status}"
+        status_label = self._status_label
 
-        status_label.update(status_text)
+        # The Lang/Ollama/Mic part only changes in _refresh_status_suffix
+        status_label.update(message + self._status_suffix)
         status_label.remove_class("status-ready", "status-listening", "status-error")
         status_label.add_class(status_class)
 
-    def add_transcript(self, text: str, is_error: bool = False):
-        """Add a transcript entry to the log."""
-        log = self.query_one("#transcript-log", RichLog)
-        timestamp = datetime.now().strftime("%H:%M:%S")
+    def _ts(self) -> str:
+        """Return the current HH:MM:SS timestamp, formatted at most once per second."""
+        now = int(time.time())
+        if now != self._ts_cache[0]:
+            self._ts_cache = (now, time.strftime("%H:%M:%S", time.localtime(now)))
+        return self._ts_cache[1]
+
+    def format_transcript(self, text: str, is_error: bool = False) -> str:
+        """Format a transcript entry as RichLog markup."""
+        timestamp = self._ts()
 
         if is_error:
-            log.write(f"[red][{timestamp}] Error: {text}[/red]")
-        else:
-            log.write(f"[cyan][{timestamp}][/cyan] [white]{text}[/white]")
+            return f"[red][{timestamp}] Error: {text}[/red]"
+        return f"[cyan][{timestamp}][/cyan] [white]{text}[/white]"
 
-    def add_ollama_response(self, text: str, is_error: bool = False):
-        """Add an Ollama response to the log."""
-        log = self.query_one("#ollama-log", RichLog)
-        timestamp = datetime.now().strftime("%H:%M:%S")
+    def format_ollama_response(self, text: str, is_error: bool = False) -> str:
+        """Format an Ollama response as RichLog markup."""
+        timestamp = self._ts()
 
         if is_error:
-            log.write(f"[red][{timestamp}] Error: {text}[/red]")
-        else:
-            log.write(f"[green][{timestamp}][/green] [white]{text}[/white]")
+            return f"[red][{timestamp}] Error: {text}[/red]"
+        return f"[green][{timestamp}][/green] [white]{text}[/white]"
+
+    def _take_ollama_lines(self, piece: str, final: bool = False) -> list:
+        """Buffer streamed Ollama text and return the lines that are complete.
+
+        RichLog cannot append to a line it has already written, so a streamed
+        reply is shown line by line; the first line carries the timestamp.
+        """
+        self._ollama_partial += piece
+        *lines, self._ollama_partial = self._ollama_partial.split("\n")
+        if final:
+            if self._ollama_partial:
+                lines.append(self._ollama_partial)
+            self._ollama_partial = ""
+
+        formatted = []
+        for line in lines:
+            if self._ollama_reply_started:
+                formatted.append(f"[white]{escape(line)}[/white]")
+            else:
+                formatted.append(self.format_ollama_response(escape(line)))
+                self._ollama_reply_started = True
 
-    def simulate_audio_level(self, duration: float = 2.0):
-        """Simulate audio level animation during listening."""
-        import random
-        import time
+        if final:
+            self._ollama_reply_started = False
+        return formatted
 
-        start_time = time.time()
-        while time.time() - start_time < duration and self.is_listening:
-            # Random audio level simulation (0-20)
-            level = random.randint(5, 20)
-            self.post_message(UpdateAudioLevel(level))
-            time.sleep(0.1)  # Update every 100ms
+    def _format_ollama_partial(self) -> str:
+        """Format the incomplete line of a streamed reply for the live label."""
+        if not self._ollama_partial:
+            return ""
+        if self._ollama_reply_started:
+            return f"[white]{escape(self._ollama_partial)}[/white]"
+        return self.format_ollama_response(escape(self._ollama_partial))
+
+    def add_transcript(self, text: str, is_error: bool = False):
+        """Add a transcript entry to the log."""
+        self._transcript_log.write(self.format_transcript(text, is_error))
 
-        # Reset to 0 when done
-        self.post_message(UpdateAudioLevel(0))
+    def add_ollama_response(self, text: str, is_error: bool = False):
+        """Add an Ollama response to the log."""
+        self._ollama_log.write(self.format_ollama_response(text, is_error))
 
     def process_with_ollama(self, user_text: str):
-        """Process user speech with Ollama in a separate thread."""
+        """Process user speech with Ollama in a background worker."""
         if not OLLAMA_AVAILABLE:
-            self.post_message(UpdateLog("ollama", "Ollama not available", True))
+            self._enqueue_update(log=("ollama", "Ollama not available", True))
             return
-            
-        def ollama_worker():
+
+        self.run_worker(self._ollama_task(user_text), name="ollama", group="llm")
+
+    async def _ollama_task(self, user_text: str):
+        """Send the user's speech to Ollama and display the reply."""
+        # One turn at a time: overlapping streams would interleave in the log
+        # and in the conversation history
+        async with self._ollama_lock:
             try:
-                self.post_message(UpdateStatus("Thinking...", "status-listening"))
+                self._enqueue_update(status=("Thinking...", "status-listening"))
 
-                # Add user message to history
+                # Add user message to history (the deque drops the oldest turns)
                 self.conversation_history.append({
                     "role": "user",
                     "content": user_text
                 })
 
-                # Limit history, but preserve system prompt if it exists
-                history_limit = 10 
-                if len(self.conversation_history) > history_limit:
-                    if self.conversation_history[0].get("role") == "system":
-                        self.conversation_history = [self.conversation_history[0]] + self.conversation_history[-(history_limit - 1):]
-                    else:
-                        self.conversation_history = self.conversation_history[-history_limit:]
-                
+                # The system prompt is kept outside the bounded history
+                messages = list(self.conversation_history)
+                if self._system_prompt:
+                    messages.insert(0, {"role": "system", "content": self._system_prompt})
+
                 # Prepare Ollama options
                 options = {}
                 if "temperature" in self.llm_config:
@@ -591,147 +862,438 @@ class SpeechRecognitionApp(App):
                 if "max_tokens" in self.llm_config:
                     options["num_predict"] = self.llm_config["max_tokens"]
 
-                # Call Ollama
-                response = ollama.chat(
+                # Call Ollama, showing the reply as it is generated
+                stream = await self.ollama_client.chat(
                     model=self.ollama_model,
-                    messages=self.conversation_history,
+                    messages=messages,
                     options=options if options else None,
+                    stream=True,
                 )
 
-                assistant_message = response['message']['content']
+                parts = []
+                async for chunk in stream:
+                    piece = chunk['message']['content']
+                    if piece:
+                        parts.append(piece)
+                        self._enqueue_update(log=("ollama_delta", piece))
+                self._enqueue_update(log=("ollama_end", ""))
 
-                # Add response to history
+                assistant_message = "".join(parts)
+
+                # Add response to history once the stream is complete
                 self.conversation_history.append({
                     "role": "assistant",
                     "content": assistant_message
                 })
 
-                # Display response
-                self.post_message(UpdateLog("ollama", assistant_message))
-
-                self.post_message(UpdateStatus("Ready", "status-ready"))
+                self._enqueue_update(status=("Ready", "status-ready"))
 
             except Exception as e:
-                self.post_message(UpdateLog("ollama", f"Error: {str(e)}", True))
-                self.post_message(UpdateStatus("Ready", "status-ready"))
-
-        threading.Thread(target=ollama_worker, daemon=True).start()
+                self._enqueue_update(log=("ollama_end", ""))
+                self._enqueue_update(log=("ollama", f"Error: {str(e)}", True))
+                self._enqueue_update(status=("Ready", "status-ready"))
 
     def start_continuous_listening(self):
-        """Start continuous listening in a separate thread."""
+        """Start continuous listening in a background worker."""
         if self.microphone_error:
             self.add_transcript("Cannot listen: Microphone error", is_error=True)
             self.stop_continuous_listening()
             return
 
-        if self.listening_thread and self.listening_thread.is_alive():
+        if self.listening_worker and self.listening_worker.is_running:
             return  # Already listening
 
-        self.listening_thread = threading.Thread(target=self.continuous_listening_loop, daemon=True)
-        self.listening_thread.start()
+        self.listening_worker = self.run_worker(
+            self.continuous_listening_loop(), name="continuous", group="listen"
+        )
 
-    def continuous_listening_loop(self):
+    async def continuous_listening_loop(self):
         """Continuously listen while L key is held."""
         self.add_transcript("Hold L to listen, release to stop")
 
-        while self.continuous_mode:
+        async with self._hold_microphone() as held:
+            if not held:
+                self.stop_continuous_listening()
+                return
+
+            job = None
             try:
-                self.listen_once_blocking()
+                while self.continuous_mode:
+                    # The consumer thread keeps capturing while earlier utterances are recognized
+                    if job is None:
+                        job = CaptureJob(
+                            "listen", phrase_time_limit=60, continuous=True,
+                            frame_duration=self.frame_duration,
+                            pre_roll=self.recognizer.non_speaking_duration,
+                        )
+                        capture = self._submit_capture(job)
+                        capture.add_done_callback(lambda _: self.utterance_ready_event.set())
+                        self.is_listening = True
+                        self._enqueue_update(status=("Listening...", "status-listening"))
+
+                    self.utterance_ready_event.clear()
+                    while self._utterances.empty() and self.continuous_mode and not capture.done():
+                        await self.utterance_ready_event.wait()
+                        self.utterance_ready_event.clear()
+
+                    if capture.done():
+                        capture.result()  # re-raise the consumer's error
+
+                    while self.continuous_mode and not self._utterances.empty():
+                        audio, text = self._utterances.get_nowait()
+                        await self.recognize_and_respond(audio, text)
+
+                    if self.continuous_mode and self._needs_recalibration():
+                        self._finish_capture(job)
+                        job = None
+                        await self.recalibrate()
+                    elif self.continuous_mode:
+                        self._enqueue_update(status=("Listening...", "status-listening"))
 
-                # Small pause between recognitions
-                if self.continuous_mode:
-                    import time
-                    time.sleep(0.3)
             except Exception as e:
-                self.post_message(UpdateLog("transcript", f"Continuous mode error: {str(e)}", True))
-                break
+                self._enqueue_update(log=("transcript", f"Continuous mode error: {str(e)}", True))
 
-        self.stop_continuous_listening()
+            finally:
+                if job is not None:
+                    self._finish_capture(job)
+                while not self._utterances.empty():
+                    self._utterances.get_nowait()
+                self.is_listening = False
 
-    def listen_once_blocking(self):
-        """Listen for speech once with Anaconda-optimized error handling."""
-        if not self.microphone:
-            self.post_message(UpdateLog("transcript", "Microphone not initialized", True))
-            return
+        self.stop_continuous_listening()
 
-        if not self.mic_lock.acquire(blocking=False):
-            self.post_message(UpdateLog("transcript", "Microphone busy", True))
-            return
+    def _open_capture_stream(self, frames: queue.SimpleQueue):
+        """Open a PortAudio callback stream that pushes PCM frames into a queue."""
+        pyaudio = self.microphone.get_pyaudio()
+        audio = pyaudio.PyAudio()
 
-        # Suppress ALSA errors during recording
-        old_stderr = sys.stderr
-        sys.stderr = SuppressStream()
+        def callback(in_data, frame_count, time_info, status):
+            # Never block the PortAudio thread: SimpleQueue.put_nowait takes no Python lock
+            frames.put_nowait(in_data)
+            return (None, pyaudio.paContinue)
 
         try:
-            self.is_listening = True
-            self.post_message(UpdateStatus("Listening...", "status-listening"))
-            self.post_message(UpdateAudioLevel(0))
+            stream = audio.open(
+                input_device_index=self.microphone.device_index,
+                channels=1,
+                format=self.microphone.format,
+                rate=self.microphone.SAMPLE_RATE,
+                frames_per_buffer=int(self.microphone.SAMPLE_RATE * self.frame_duration),
+                input=True,
+                stream_callback=callback,
+            )
+        except Exception:
+            audio.terminate()
+            raise
+
+        return audio, stream
+
+    def _close_capture_stream(self, audio, stream):
+        """Stop and close a capture stream opened by _open_capture_stream."""
+        try:
+            if stream.is_active():
+                stream.stop_stream()
+            stream.close()
+        finally:
+            audio.terminate()
+
+    def open_microphone_stream(self):
+        """Open the long-lived capture stream and start its frame consumer thread."""
+        self.close_microphone_stream()
+        self._pcm_q = queue.SimpleQueue()
+        self._capture = self._open_capture_stream(self._pcm_q)
+        threading.Thread(target=self._consume_frames, args=(self._pcm_q,), daemon=True).start()
+
+    def close_microphone_stream(self):
+        """Close the capture stream, if one is open, and stop its consumer."""
+        if self._capture is None:
+            return
+        audio_dev, stream = self._capture
+        self._capture = None
+        try:
+            self._close_capture_stream(audio_dev, stream)
+        finally:
+            self._pcm_q.put_nowait(None)
+            job = self._capture_job
+            if job is not None:
+                self._finish_capture(job, error=RuntimeError("Microphone stream closed"))
+
+    def _adjust_energy_threshold(self, energy: float, seconds: float):
+        """Move the energy threshold towards the current ambient energy (same rule as SpeechRecognition)."""
+        damping = self.recognizer.dynamic_energy_adjustment_damping ** seconds
+        target_energy = energy * self.recognizer.dynamic_energy_ratio
+        self.recognizer.energy_threshold = (
+            self.recognizer.energy_threshold * damping + target_energy * (1 - damping)
+        )
+
+    def _measure_frame(self, frame: bytes) -> float:
+        """Return the RMS energy of an int16 frame and publish it to the audio level bar."""
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt((samples ** 2).mean())) if samples.size else 0.0
+        self._enqueue_update(audio_level=int(20 * min(1.0, rms / 8000)))
+        return rms
+
+    @contextlib.asynccontextmanager
+    async def _hold_microphone(self):
+        """Hold the microphone for one capture; yields False (after logging) if unavailable."""
+        if not self.microphone:
+            self._enqueue_update(log=("transcript", "Microphone not initialized", True))
+            yield False
+        elif self.mic_lock.locked():
+            self._enqueue_update(log=("transcript", "Microphone busy", True))
+            yield False
+        else:
+            async with self.mic_lock:
+                yield True
+
+    def _needs_recalibration(self) -> bool:
+        """Whether repeated misses call for a fresh ambient calibration."""
+        # Repeated misses usually mean the noise floor has changed
+        return not self._use_vad and self.unrecognized_count >= self.recalibrate_after
+
+    def _submit_capture(self, job: "CaptureJob") -> asyncio.Future:
+        """Hand a capture job to the consumer thread and return an awaitable for its result."""
+        if self._capture is None:
+            raise RuntimeError("Microphone stream is not open")
+        if job.kind == "listen":
+            job.streaming = self._streaming_recognizer()
+        job.loop = asyncio.get_running_loop()
+        self._capture_job = job
+        return asyncio.wrap_future(job.future)
+
+    def _streaming_recognizer(self):
+        """Return a Vosk recognizer for the current language, or None to use Google."""
+        if self.vosk_model is None or self.language != self.vosk_language:
+            return None
+        return vosk.KaldiRecognizer(self.vosk_model, self.microphone.SAMPLE_RATE)
+
+    def _finish_capture(self, job: "CaptureJob", result=None, error=None):
+        """Detach a job from the consumer and resolve its future."""
+        if self._capture_job is job:
+            self._capture_job = None
+        self._enqueue_update(audio_level=0)
+        try:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        except concurrent.futures.InvalidStateError:
+            pass  # already resolved, e.g. the stream was closed at the same moment
 
-            # Start audio level animation in background
-            animation_thread = threading.Thread(target=self.simulate_audio_level, args=(3.0,), daemon=True)
-            animation_thread.start()
+    def _consume_frames(self, frames: queue.SimpleQueue):
+        """Consumer thread: meter, calibrate and segment frames from the capture callback."""
+        while True:
+            try:
+                frame = frames.get(timeout=1.0)
+            except queue.Empty:
+                job = self._capture_job
+                if job is not None:
+                    self._finish_capture(job, error=RuntimeError("Audio stream stalled"))
+                continue
 
-            with self.microphone as source:
-                # Adjust for noise with shorter duration
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.3)
+            if frame is None:
+                return  # stream closed
 
-                # Listen with reasonable timeout
-                audio = self.recognizer.listen(source, timeout=10, phrase_time_limit=60)
+            # Frames that arrive while nobody is listening are simply dropped
+            job = self._capture_job
+            if job is None:
+                continue
 
-            self.is_listening = False
-            self.post_message(UpdateAudioLevel(0))
-            self.post_message(UpdateStatus("Recognizing...", "status-listening"))
+            try:
+                if job.kind == "calibrate":
+                    self._calibrate_step(job, frame)
+                else:
+                    self._listen_step(job, frame)
+            except Exception as e:
+                self._finish_capture(job, error=e)
+
+    def _calibrate_step(self, job: "CaptureJob", frame: bytes):
+        """Adjust the energy threshold to one frame of ambient noise."""
+        job.elapsed += self.frame_duration
+        self._adjust_energy_threshold(self._measure_frame(frame), self.frame_duration)
+        if job.elapsed >= job.duration:
+            self._finish_capture(job)
+
+    def _listen_step(self, job: "CaptureJob", frame: bytes):
+        """Run the VAD on one frame, finishing the job at end of utterance."""
+        recognizer = self.recognizer
+        energy = self._measure_frame(frame)  # also drives the level meter
+        if self._use_vad:
+            is_speech = self.vad.is_speech(frame, self.microphone.SAMPLE_RATE)
+        else:
+            is_speech = energy > recognizer.energy_threshold
+        job.elapsed += self.frame_duration
+
+        if not job.speaking:
+            if self._use_vad:
+                # The VAD flags stray frames (especially while it adapts), so only
+                # start once most of the recent window is voiced
+                job.voiced.append(is_speech)
+                is_speech = (len(job.voiced) == job.voiced.maxlen
+                             and sum(job.voiced) >= 0.9 * job.voiced.maxlen)
+
+            # Wait for speech to start, keeping a short pre-roll of silence
+            if not is_speech:
+                if job.timeout and job.elapsed > job.timeout:
+                    raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                if recognizer.dynamic_energy_threshold and not self._use_vad:
+                    self._adjust_energy_threshold(energy, self.frame_duration)
+                job.utterance.append(frame)
+                if len(job.utterance) > job.pre_roll_frames:
+                    job.utterance.popleft()
+                return
+
+            # A language toggle only changes the engine at a phrase boundary
+            job.apply_pending_streaming()
+            for buffered in job.utterance:
+                self._feed_streaming(job, buffered)
+            job.speaking = True
+            job.phrase_start = job.elapsed
+            job.voiced_frames = sum(job.voiced)  # the VAD's onset window was already voiced
+
+        # Record until the speaker pauses, applying the pause threshold per frame
+        job.utterance.append(frame)
+        self._feed_streaming(job, frame)
+        if is_speech:
+            job.silent_frames = 0
+            job.voiced_frames += 1
+        else:
+            job.silent_frames += 1
+
+        pause_threshold = self.vad_pause_threshold if self._use_vad else recognizer.pause_threshold
+        pause_frames = int(math.ceil(pause_threshold / self.frame_duration))
+        phrase_limit_reached = (job.phrase_time_limit
+                                and job.elapsed - job.phrase_start > job.phrase_time_limit)
+        if job.silent_frames >= pause_frames or phrase_limit_reached:
+            # Like SpeechRecognition's listen(): too little speech is noise, so drop it
+            phrase_frames = int(math.ceil(recognizer.phrase_threshold / self.frame_duration))
+            if not phrase_limit_reached and job.voiced_frames < phrase_frames:
+                job.discard(keep_frames=job.pre_roll_frames)
+                return
+
+            # Keep only non_speaking_duration of the trailing silence
+            keep_silent = int(math.ceil(recognizer.non_speaking_duration / self.frame_duration))
+            for _ in range(job.silent_frames - keep_silent):
+                job.utterance.pop()
+
+            if job.continuous:
+                # Hand the utterance over and keep listening without a gap
+                self._utterances.put_nowait(job.result(self.microphone))
+                job.loop.call_soon_threadsafe(self.utterance_ready_event.set)
+            else:
+                self._finish_capture(job, result=job.result(self.microphone))
+
+    def _feed_streaming(self, job: "CaptureJob", frame: bytes):
+        """Feed a frame to the streaming recognizer (if any) and show partial results."""
+        streaming = job.streaming
+        if streaming is None:
+            return
+        if streaming.AcceptWaveform(frame):
+            segment = json.loads(streaming.Result()).get("text", "")
+            if segment:
+                job.segments.append(segment)
+        else:
+            partial = json.loads(streaming.PartialResult()).get("partial", "")
+            if partial and partial != job.last_partial:
+                job.last_partial = partial
+                heard = " ".join(job.segments + [partial])
+                self._enqueue_update(status=(f"Listening: {heard}", "status-listening"))
+
+    async def recalibrate(self, duration: float = 0.5):
+        """Re-run ambient noise calibration (the caller must hold mic_lock)."""
+        self._enqueue_update(status=("Calibrating...", "status-listening"))
+        await self._submit_capture(CaptureJob("calibrate", duration=duration, frame_duration=self.frame_duration))
+        self.unrecognized_count = 0
+        await asyncio.to_thread(save_ambient, self.recognizer)
+        self._enqueue_update(log=("transcript",
+            f"✓ Calibrated for ambient noise (energy threshold {self.recognizer.energy_threshold:.0f})"))
+        self._enqueue_update(status=("Ready", "status-ready"))
+
+    async def listen_once(self):
+        """Listen for speech once with Anaconda-optimized error handling."""
+        async with self._hold_microphone() as held:
+            if not held:
+                return
 
             try:
-                # Try recognition
-                text = self.recognizer.recognize_google(audio, language=self.language)
-                self.post_message(UpdateLog("transcript", text))
+                self.is_listening = True
+                self._enqueue_update(status=("Listening...", "status-listening"))
+                self._enqueue_update(audio_level=0)
 
-                # Process with Ollama if enabled
-                if self.ollama_enabled:
-                    self.process_with_ollama(text)
-                else:
-                    self.post_message(UpdateStatus("Ready", "status-ready"))
-                    
-            except sr.UnknownValueError:
-                self.post_message(UpdateLog("transcript", "Tidak dapat memahami audio", True))
-                if self.debug_mode:
-                    self.post_message(UpdateLog("transcript", 
-                        f"Debug: Audio length={len(audio.frame_data)} bytes", False))
-                    try:
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = f"unrecognized_audio_{timestamp}.wav"
-                        with open(filename, "wb") as f:
-                            f.write(audio.get_wav_data())
-                        self.post_message(UpdateLog("transcript", 
-                            f"Debug: Unrecognized audio saved to '{filename}'", False))
-                    except Exception as e:
-                        self.post_message(UpdateLog("transcript", 
-                            f"Debug: Failed to save audio file: {e}", True))
-                self.post_message(UpdateStatus("Ready", "status-ready"))
-                
-            except sr.RequestError as e:
-                self.post_message(UpdateLog("transcript", f"API error: {str(e)}", True))
-                self.post_message(UpdateStatus("Ready", "status-ready"))
+                # Stream frames as they are captured instead of recording the whole phrase first
+                audio, text = await self._submit_capture(CaptureJob(
+                    "listen", timeout=10, phrase_time_limit=60,
+                    frame_duration=self.frame_duration,
+                    pre_roll=self.recognizer.non_speaking_duration,
+                ))
 
-        except sr.WaitTimeoutError:
-            self.is_listening = False
-            self.post_message(UpdateAudioLevel(0))
-            self.post_message(UpdateLog("transcript", "Timeout - no speech detected", True))
-            self.post_message(UpdateStatus("Ready", "status-ready"))
+                self.is_listening = False
+                await self.recognize_and_respond(audio, text)
 
-        except Exception as e:
-            self.is_listening = False
-            self.post_message(UpdateAudioLevel(0))
-            self.post_message(UpdateLog("transcript", f"Error: {str(e)}", True))
-            self.post_message(UpdateStatus("Ready", "status-ready"))
+                if self._needs_recalibration():
+                    await self.recalibrate()
 
-        finally:
-            self.is_listening = False
-            sys.stderr = old_stderr
-            self.mic_lock.release()
+            except sr.WaitTimeoutError:
+                self.is_listening = False
+                self._enqueue_update(audio_level=0)
+                self._enqueue_update(log=("transcript", "Timeout - no speech detected", True))
+                self._enqueue_update(status=("Ready", "status-ready"))
 
+            except Exception as e:
+                self.is_listening = False
+                self._enqueue_update(audio_level=0)
+                self._enqueue_update(log=("transcript", f"Error: {str(e)}", True))
+                self._enqueue_update(status=("Ready", "status-ready"))
 
+            finally:
+                self.is_listening = False
+
+    async def recognize_and_respond(self, audio: sr.AudioData, text: str = None):
+        """Recognize a captured utterance (unless Vosk already did) and pass it on to Ollama."""
+        self._enqueue_update(status=("Recognizing...", "status-listening"))
+
+        try:
+            # Try recognition (Vosk has already decoded the audio while streaming)
+            if text is None:
+                text = await asyncio.to_thread(
+                    self.recognizer.recognize_google, audio, language=self.language
+                )
+            elif not text:
+                raise sr.UnknownValueError()
+            self._enqueue_update(log=("transcript", text))
+            self.unrecognized_count = 0
+
+            # Process with Ollama if enabled
+            if self.ollama_enabled:
+                self.process_with_ollama(text)
+            else:
+                self._enqueue_update(status=("Ready", "status-ready"))
+                
+        except sr.UnknownValueError:
+            self.unrecognized_count += 1
+            self._enqueue_update(log=("transcript", "Tidak dapat memahami audio", True))
+            if self.debug_mode:
+                self._enqueue_update(log=("transcript", 
+                    f"Debug: Audio length={len(audio.frame_data)} bytes", False))
+                try:
+                    timestamp = time.strftime("%Y%m%d_%H%M%S")
+                    filename = f"unrecognized_audio_{timestamp}.wav"
+                    # Write the captured frames directly instead of building a WAV copy in memory
+                    with wave.open(filename, "wb") as wav_file:
+                        wav_file.setnchannels(1)
+                        wav_file.setsampwidth(audio.sample_width)
+                        wav_file.setframerate(audio.sample_rate)
+                        wav_file.writeframes(audio.frame_data)
+                    self._enqueue_update(log=("transcript", 
+                        f"Debug: Unrecognized audio saved to '{filename}'", False))
+                except Exception as e:
+                    self._enqueue_update(log=("transcript", 
+                        f"Debug: Failed to save audio file: {e}", True))
+            self._enqueue_update(status=("Ready", "status-ready"))
+
+        except sr.RequestError as e:
+            self._enqueue_update(log=("transcript", f"API error: {str(e)}", True))
+            self._enqueue_update(status=("Ready", "status-ready"))
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Handle button presses."""
@@ -754,23 +1316,15 @@ class SpeechRecognitionApp(App):
             self.add_transcript("Cannot listen: Microphone error", is_error=True)
             return
 
-        threading.Thread(target=self.listen_once_blocking, daemon=True).start()
+        self.run_worker(self.listen_once(), name="listen", group="listen")
 
     def action_clear(self):
         """Clear logs."""
-        transcript_log = self.query_one("#transcript-log", RichLog)
-        ollama_log = self.query_one("#ollama-log", RichLog)
-        transcript_log.clear()
-        ollama_log.clear()
+        self._transcript_log.clear()
+        self._ollama_log.clear()
         
-        # Reset conversation history, keeping system prompt if it exists
-        if self.llm_config and self.llm_config.get("system_prompt"):
-            self.conversation_history = [{
-                "role": "system",
-                "content": self.llm_config["system_prompt"]
-            }]
-        else:
-            self.conversation_history = []
+        # Reset conversation history (the system prompt is stored separately)
+        self.conversation_history.clear()
 
         self.add_transcript("Logs cleared")
 
@@ -781,7 +1335,9 @@ class SpeechRecognitionApp(App):
             return
 
         self.ollama_enabled = not self.ollama_enabled
-        btn = self.query_one("#btn-ollama", Button)
+        self._ollama_status_str = "ON" if self.ollama_enabled else "OFF"
+        self._refresh_status_suffix()
+        btn = self._btn_ollama
 
         if self.ollama_enabled:
             btn.variant = "success"
@@ -803,12 +1359,23 @@ class SpeechRecognitionApp(App):
             self.language = "id-ID"
             lang_code = "ID"
             lang_name = "Indonesian"
+        self._lang_name = lang_name
+        self._refresh_status_suffix()
 
         # Update button
-        btn = self.query_one("#btn-lang", Button)
+        btn = self._btn_lang
         btn.label = f"Lang: {lang_code} [G]"
 
-        self.add_transcript(f"Language changed to {lang_name}")
+        # Vosk only covers its model's language; other languages go to Google
+        engine = ""
+        if self.vosk_model is not None:
+            job = self._capture_job
+            if job is not None and job.kind == "listen":
+                # Continuous mode keeps its job; the consumer switches at the next phrase
+                job.request_streaming(self._streaming_recognizer())
+            engine = " (offline Vosk)" if self.language == self.vosk_language else " (Google)"
+
+        self.add_transcript(f"Language changed to {lang_name}{engine}")
         self.update_status("Ready", "status-ready")
 
 
@@ -820,18 +1387,24 @@ class SpeechRecognitionApp(App):
         
         # Find current index
         current_pos = 0
-        for i, (idx, _) in enumerate(self.available_mics):
-            if idx == self.selected_mic_index:
+        for i, mic in enumerate(self.available_mics):
+            if mic.index == self.selected_mic_index:
                 current_pos = i
                 break
         
         # Move to next microphone
         next_pos = (current_pos + 1) % len(self.available_mics)
-        next_idx, next_name = self.available_mics[next_pos]
-        
-        short_name = next_name.split(':')[-1].strip() if ':' in next_name else next_name
+        next_idx, _, short_name, _ = self.available_mics[next_pos]
+
+        # Don't pull the stream out from under an active listen. This handler never
+        # awaits, so no worker can take the lock while the switch is in progress.
+        if self.mic_lock.locked():
+            self.add_transcript("Microphone busy", is_error=True)
+            return
+
         self.add_transcript(f"Switching to: {short_name}")
-        
+        self.close_microphone_stream()
+
         if self.initialize_microphone(next_idx):
             self.add_transcript(f"✓ Now using: {short_name}")
             self.update_status("Ready", "status-ready")
@@ -839,6 +1412,26 @@ class SpeechRecognitionApp(App):
         else:
             self.add_transcript(f"✗ Failed to initialize: {short_name}", is_error=True)
 
+    def action_recalibrate(self):
+        """Re-measure ambient noise for the current microphone."""
+        if self.microphone_error:
+            self.add_transcript("Cannot calibrate: Microphone error", is_error=True)
+            return
+
+        self.run_worker(self._recalibrate_task(), name="recalibrate", group="listen")
+
+    async def _recalibrate_task(self, duration: float = 0.5):
+        """Run a user-requested recalibration while holding the microphone."""
+        async with self._hold_microphone() as held:
+            if not held:
+                return
+
+            try:
+                await self.recalibrate(duration)
+            except Exception as e:
+                self._enqueue_update(log=("transcript", f"Calibration error: {str(e)}", True))
+                self._enqueue_update(status=("Ready", "status-ready"))
+
     def action_toggle_debug(self):
         """Toggle debug mode."""
         self.debug_mode = not self.debug_mode
@@ -847,6 +1440,7 @@ class SpeechRecognitionApp(App):
     def action_quit(self):
         """Quit the application."""
         self.continuous_mode = False
+        self.close_microphone_stream()
         self.exit()
 
 
@@ -5,32 +5,32 @@ Test script to verify speech recognition setup
 
 import sys
 
+from ambient_cache import load_ambient, save_ambient
+from import_probe import probe_imports, optional_module
+
+probe_imports(['speech_recognition', 'textual', 'pyaudio'])
+sr = optional_module('speech_recognition')
+
 
 def test_imports():
     """Test if all required modules can be imported."""
     print("Testing imports...")
 
-    try:
-        import speech_recognition as sr
-        print("✓ SpeechRecognition imported successfully")
-    except ImportError as e:
-        print(f"✗ Failed to import SpeechRecognition: {e}")
-        return False
-
-    try:
-        import textual
-        print("✓ Textual imported successfully")
-    except ImportError as e:
-        print(f"✗ Failed to import Textual: {e}")
-        return False
-
-    try:
-        import pyaudio
-        print("✓ PyAudio imported successfully")
-    except ImportError as e:
-        print(f"✗ Failed to import PyAudio: {e}")
-        print("  Note: PyAudio requires system dependencies. See README.md")
-        return False
+    packages = {
+        'speech_recognition': 'SpeechRecognition',
+        'textual': 'Textual',
+        'pyaudio': 'PyAudio',
+    }
+    errors = probe_imports(list(packages))  # answered from the import cache
+
+    # Report in a fixed order, stopping at the first failure
+    for module, name in packages.items():
+        if errors[module] is not None:
+            print(f"✗ Failed to import {name}: {errors[module]}")
+            if module == 'pyaudio':
+                print("  Note: PyAudio requires system dependencies. See README.md")
+            return False
+        print(f"✓ {name} imported successfully")
 
     return True
 
@@ -39,9 +39,11 @@ def test_microphone():
     """Test if microphone is available."""
     print("\nTesting microphone...")
 
-    try:
-        import speech_recognition as sr
+    if sr is None:
+        print("✗ SpeechRecognition is not installed")
+        return False
 
+    try:
         # List available microphones
         mics = sr.Microphone.list_microphone_names()
         print(f"✓ Found {len(mics)} microphone(s):")
@@ -62,17 +64,21 @@ def test_recognizer():
     """Test if speech recognizer can be initialized."""
     print("\nTesting speech recognizer...")
 
-    try:
-        import speech_recognition as sr
+    if sr is None:
+        print("✗ SpeechRecognition is not installed")
+        return False
 
+    try:
         recognizer = sr.Recognizer()
         print("✓ Speech recognizer initialized successfully")
 
-        # Test ambient noise adjustment
+        # Test ambient noise adjustment; a saved threshold converges in a few frames
+        duration = 0.2 if load_ambient(recognizer) else 1
         with sr.Microphone() as source:
-            print("  Adjusting for ambient noise (1 second)...")
-            recognizer.adjust_for_ambient_noise(source, duration=1)
+            print(f"  Adjusting for ambient noise ({duration} second)...")
+            recognizer.adjust_for_ambient_noise(source, duration=duration)
             print("✓ Ambient noise adjustment complete")
+        save_ambient(recognizer)
 
         return True
 
@@ -6,21 +6,160 @@ Tests microphone setup and speech recognition capabilities
 
 import sys
 import os
+import io
+import contextlib
 import platform
-import subprocess
+import json
+import collections
+import socket
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache, wraps
+
+from ambient_cache import load_ambient, save_ambient
+from import_probe import probe_imports, optional_module
+
+PACKAGES = {
+    'pyaudio': 'PyAudio',
+    'speech_recognition': 'SpeechRecognition',
+    'textual': 'Textual',
+    'ollama': 'Ollama (optional)'
+}
+
+# Load every dependency once, in parallel, when the tool starts
+probe_imports(list(PACKAGES) + ['webrtcvad'])
+sr = optional_module('speech_recognition')
+pyaudio = optional_module('pyaudio')
+ollama = optional_module('ollama')
+webrtcvad = optional_module('webrtcvad')  # optional: replaces calibration in the speech test
+WEBRTCVAD_RATES = (8000, 16000, 32000, 48000)
+
+SYSTEM = platform.system()
+
+# One PortAudio instance for device queries during check_microphone
+# (sr.Microphone streams always create their own)
+_pyaudio = None
+
+# Device index and sample rate that check_microphone proved working
+_mic_settings = {}
+
+def get_pyaudio():
+    """Return the shared PyAudio instance, creating it on first use"""
+    global _pyaudio
+    if _pyaudio is None:
+        _pyaudio = pyaudio.PyAudio()
+    return _pyaudio
+
+def release_pyaudio():
+    """Terminate the shared PyAudio instance, if one was created"""
+    global _pyaudio
+    if _pyaudio is not None:
+        _pyaudio.terminate()
+        _pyaudio = None
+
+def find_alsa_input_device(p):
+    """Return the ALSA host API's default input device on Linux, or None"""
+    if SYSTEM != "Linux":
+        return None
+    for i in range(p.get_host_api_count()):
+        api = p.get_host_api_info_by_index(i)
+        if api.get('name') == 'ALSA':
+            index = api.get('defaultInputDevice', -1)
+            return index if index >= 0 else None
+    return None
+
+def ollama_address():
+    """Return (scheme, host, port) of the Ollama daemon, honouring OLLAMA_HOST like the client does"""
+    host = os.environ.get("OLLAMA_HOST", "").strip() or "127.0.0.1:11434"
+    url = urllib.parse.urlsplit(host if "://" in host else f"http://{host}")
+    hostname = url.hostname or "127.0.0.1"
+    if hostname == "0.0.0.0":  # a listen-on-all address; connect locally
+        hostname = "127.0.0.1"
+    return url.scheme, hostname, url.port or (443 if url.scheme == "https" else 11434)
+
+@lru_cache(maxsize=1)
+def probe_ollama():
+    """Return the names of installed Ollama models, or None if the daemon is not running"""
+    scheme, host, port = ollama_address()
+    
+    # A refused TCP connect answers "not running" without any HTTP or JSON work
+    try:
+        socket.create_connection((host, port), timeout=0.1).close()
+    except OSError:
+        return None
+    
+    connection = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    conn = connection(host, port, timeout=0.3)
+    try:
+        conn.request("GET", "/api/tags")
+        response = conn.getresponse()
+        if response.status != 200:
+            return None
+        return [model['name'] for model in json.loads(response.read()).get('models', [])]
+    except (OSError, ValueError, KeyError, http.client.HTTPException):
+        return None
+    finally:
+        conn.close()
+
+def buffered_output(check):
+    """Collect a check's printed output and write it to the terminal in one go"""
+    @wraps(check)
+    def wrapper(*args, **kwargs):
+        buf = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(buf):
+                return check(*args, **kwargs)
+        finally:
+            sys.stdout.write(buf.getvalue())
+            sys.stdout.flush()
+    return wrapper
+
+def listen_with_vad(source, vad, timeout=5, phrase_time_limit=5, pause=0.3):
+    """Record one phrase, using WebRTC VAD on 20 ms frames to find its start and end"""
+    frame_ms = 20
+    chunk = source.SAMPLE_RATE * frame_ms // 1000
+    pre_roll = collections.deque(maxlen=10)  # keep ~200 ms before speech starts
+    voiced = collections.deque(maxlen=10)
+    frames = []
+    elapsed = 0.0
+    silent = 0
+    
+    while True:
+        frame = source.stream.read(chunk)
+        elapsed += frame_ms / 1000
+        is_speech = vad.is_speech(frame, source.SAMPLE_RATE)
+        
+        if not frames:
+            # Stray voiced frames are common while the VAD adapts, so only
+            # start once most of the last 200 ms is voiced
+            voiced.append(is_speech)
+            if len(voiced) < voiced.maxlen or sum(voiced) < 0.9 * voiced.maxlen:
+                if elapsed > timeout:
+                    raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                pre_roll.append(frame)
+                continue
+            frames.extend(pre_roll)
+            elapsed = 0.0
+        
+        frames.append(frame)
+        silent = 0 if is_speech else silent + 1
+        if silent * frame_ms / 1000 >= pause or elapsed > phrase_time_limit:
+            return sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
 
 def print_header(text):
     print("\n" + "="*50)
     print(f" {text}")
     print("="*50)
 
+@buffered_output
 def check_environment():
     """Check if running in conda environment"""
     print_header("Environment Check")
     
     print(f"Python executable: {sys.executable}")
     print(f"Python version: {sys.version}")
-    print(f"Platform: {platform.system()} {platform.release()}")
+    print(f"Platform: {SYSTEM} {platform.release()}")
     
     # Check if in conda environment
     conda_env = os.environ.get('CONDA_DEFAULT_ENV', 'Not in conda environment')
@@ -34,24 +173,18 @@ def check_environment():
     
     return 'conda' in sys.executable or 'anaconda' in sys.executable.lower()
 
+@buffered_output
 def check_packages():
     """Check if required packages are installed"""
     print_header("Package Check")
     
-    packages = {
-        'pyaudio': 'PyAudio',
-        'speech_recognition': 'SpeechRecognition',
-        'textual': 'Textual',
-        'ollama': 'Ollama (optional)'
-    }
-    
     missing = []
+    errors = probe_imports(list(PACKAGES))  # answered from the import cache
     
-    for module, name in packages.items():
-        try:
-            __import__(module)
+    for module, name in PACKAGES.items():
+        if errors[module] is None:
             print(f"✓ {name} installed")
-        except ImportError:
+        else:
             print(f"✗ {name} NOT installed")
             missing.append(module)
     
@@ -65,179 +198,229 @@ def check_packages():
     
     return len(missing) == 0
 
+@buffered_output
 def check_microphone():
     """Check microphone availability"""
+    try:
+        return _check_microphone()
+    finally:
+        release_pyaudio()
+
+def _check_microphone():
+    """List microphones and find a working sample rate (uses the shared PyAudio)"""
     print_header("Microphone Check")
     
+    if sr is None:
+        print("✗ speech_recognition not installed")
+        print("  Run: pip install SpeechRecognition")
+        return False
+    if pyaudio is None:
+        print("✗ PyAudio not installed")
+        print("  Run: conda install -c conda-forge pyaudio")
+        return False
+    
+    # List all devices from the shared PortAudio instance
+    p = get_pyaudio()
+    mic_list = [p.get_device_info_by_index(i)['name'] for i in range(p.get_device_count())]
     try:
-        import speech_recognition as sr
-        
-        # List all microphones
-        mic_list = sr.Microphone.list_microphone_names()
-        
-        if not mic_list:
-            print("✗ No microphones detected!")
-            print("\nTroubleshooting:")
-            print("  1. Check if microphone is connected")
-            print("  2. Check system audio settings")
-            print("  3. On Linux: sudo usermod -a -G audio $USER")
-            return False
-        
-        print(f"✓ Found {len(mic_list)} microphone(s):\n")
-        for i, name in enumerate(mic_list):
-            print(f"  [{i}] {name}")
-            if 'default' in name.lower():
-                print(f"      ^ This is likely your default microphone")
+        default_idx = int(p.get_default_input_device_info()['index'])
+    except (IOError, OSError):
+        default_idx = None  # no default input device
+    
+    if not mic_list:
+        print("✗ No microphones detected!")
+        print("\nTroubleshooting:")
+        print("  1. Check if microphone is connected")
+        print("  2. Check system audio settings")
+        print("  3. On Linux: sudo usermod -a -G audio $USER")
+        return False
+    
+    print(f"✓ Found {len(mic_list)} microphone(s):\n")
+    print("\n".join(
+        f"  [{i}] {name}" + ("\n      ^ This is your default microphone" if i == default_idx else "")
+        for i, name in enumerate(mic_list)
+    ))
+    
+    # Test microphone initialization
+    print("\nTesting microphone initialization...")
+    try:
+        # Try the rate the device advertises first, then the usual ones.
+        # On Linux, talk to ALSA directly rather than through the PulseAudio plugin.
+        alsa_index = find_alsa_input_device(p)
+        device_index = alsa_index if alsa_index is not None else default_idx
+        default_rate = None
+        if device_index is not None:
+            default_rate = int(p.get_device_info_by_index(device_index)['defaultSampleRate'])
+        sample_rates = [default_rate] if default_rate else []
+        sample_rates += [r for r in (16000, 44100, 48000) if r != default_rate]
+        working_rate = None
         
-        # Test microphone initialization
-        print("\nTesting microphone initialization...")
-        try:
-            # Try different sample rates
-            sample_rates = [16000, 44100, 48000]
-            working_rate = None
-            
-            for rate in sample_rates:
+        for rate in sample_rates:
+            # Querying format support is cheap; opening a stream is not
+            if device_index is not None:
                 try:
-                    mic = sr.Microphone(sample_rate=rate)
-                    with mic as source:
-                        r = sr.Recognizer()
-                        r.adjust_for_ambient_noise(source, duration=0.1)
-                    working_rate = rate
-                    break
-                except:
+                    if not p.is_format_supported(rate, input_device=device_index,
+                                                 input_channels=1,
+                                                 input_format=pyaudio.paInt16):
+                        continue
+                except ValueError:
                     continue
-            
-            if working_rate:
-                print(f"✓ Microphone works with sample rate: {working_rate} Hz")
-                return True
-            else:
-                print("✗ Could not initialize microphone with any sample rate")
-                return False
-                
-        except Exception as e:
-            print(f"✗ Microphone initialization failed: {str(e)}")
+            try:
+                mic = sr.Microphone(device_index=device_index, sample_rate=rate,
+                                    chunk_size=1024)
+                with mic as source:
+                    r = sr.Recognizer()
+                    # One chunk is enough to prove the stream opens
+                    r.adjust_for_ambient_noise(source, duration=0.05)
+                working_rate = rate
+                break
+            except:
+                continue
+        
+        if working_rate:
+            _mic_settings.update(device_index=device_index, sample_rate=working_rate)
+            print(f"✓ Microphone works with sample rate: {working_rate} Hz")
+            return True
+        else:
+            print("✗ Could not initialize microphone with any sample rate")
             return False
             
-    except ImportError:
-        print("✗ speech_recognition not installed")
-        print("  Run: pip install SpeechRecognition")
+    except Exception as e:
+        print(f"✗ Microphone initialization failed: {str(e)}")
         return False
 
 def test_speech_recognition():
     """Test actual speech recognition"""
     print_header("Speech Recognition Test")
     
+    if sr is None:
+        print("✗ speech_recognition not installed")
+        return
+    
+    r = sr.Recognizer()
+    r.operation_timeout = 10  # caps how long an abandoned Google request can delay exit
+    calibrate_duration = 0.2 if load_ambient(r) else 1
+    
+    # Ask user if they want to test
+    response = input("\nDo you want to test speech recognition? (y/n): ").lower()
+    if response != 'y':
+        print("Skipping speech recognition test")
+        return
+    
+    print("\nPreparing to listen...")
+    print("When you see 'Listening...', speak clearly into your microphone")
+    print("The test will listen for 5 seconds maximum")
+    
     try:
-        import speech_recognition as sr
-        
-        r = sr.Recognizer()
-        
-        # Ask user if they want to test
-        response = input("\nDo you want to test speech recognition? (y/n): ").lower()
-        if response != 'y':
-            print("Skipping speech recognition test")
-            return
-        
-        print("\nPreparing to listen...")
-        print("When you see 'Listening...', speak clearly into your microphone")
-        print("The test will listen for 5 seconds maximum")
-        
-        try:
-            with sr.Microphone() as source:
+        # Small buffers keep capture latency low; PyAudio already asks
+        # PortAudio for the device's defaultLowInputLatency
+        with sr.Microphone(chunk_size=256, **_mic_settings) as source:
+            if webrtcvad is not None and source.SAMPLE_RATE in WEBRTCVAD_RATES:
+                # The VAD classifies every frame itself, so no calibration pass is needed
+                print("\nUsing WebRTC VAD")
+                print("LISTENING... Speak now!")
+                audio = listen_with_vad(source, webrtcvad.Vad(2))
+            else:
                 print("\nAdjusting for ambient noise...")
-                r.adjust_for_ambient_noise(source, duration=1)
+                r.adjust_for_ambient_noise(source, duration=calibrate_duration)
+                save_ambient(r)
                 
                 print("LISTENING... Speak now!")
                 audio = r.listen(source, timeout=5, phrase_time_limit=5)
-                
-                print("Processing speech...")
-                
-                # Try multiple recognition engines
+            
+            print("Processing speech...")
+            
+            # Try multiple recognition engines; don't let a slow network hang the test
+            pool = ThreadPoolExecutor(max_workers=1)
+            google = pool.submit(r.recognize_google, audio)
+            try:
+                text = google.result(timeout=3.0)
+                print(f"✓ Google Speech Recognition heard: '{text}'")
+            except FutureTimeout:
+                print("✗ Google did not answer within 3 seconds, trying offline Sphinx...")
                 try:
-                    text = r.recognize_google(audio)
-                    print(f"✓ Google Speech Recognition heard: '{text}'")
+                    text = r.recognize_sphinx(audio)
+                    print(f"✓ Sphinx heard: '{text}'")
                 except sr.UnknownValueError:
                     print("✗ Could not understand audio")
                 except sr.RequestError as e:
-                    print(f"✗ Google API error: {e}")
-                
-        except sr.WaitTimeoutError:
-            print("✗ No speech detected within timeout period")
-        except Exception as e:
-            print(f"✗ Error during recording: {str(e)}")
+                    print(f"✗ Sphinx not available: {e}")
+                    print("  Install with: pip install pocketsphinx")
+            except sr.UnknownValueError:
+                print("✗ Could not understand audio")
+            except sr.RequestError as e:
+                print(f"✗ Google API error: {e}")
+            finally:
+                # A running request cannot be cancelled. After a timeout it keeps
+                # going in the background, and since executor threads are joined at
+                # interpreter exit, exit can be delayed by up to operation_timeout (10 s).
+                pool.shutdown(wait=False)
             
-    except ImportError:
-        print("✗ speech_recognition not installed")
+    except sr.WaitTimeoutError:
+        print("✗ No speech detected within timeout period")
+    except Exception as e:
+        print(f"✗ Error during recording: {str(e)}")
 
 def check_ollama():
     """Check if Ollama is available"""
     print_header("Ollama Check (Optional)")
     
     # Check if ollama module is installed
-    try:
-        import ollama
-        print("✓ Ollama Python module installed")
-        
-        # Check if Ollama service is running
-        try:
-            models = ollama.list()
-            print(f"✓ Ollama service is running")
-            if models['models']:
-                print(f"  Available models:")
-                for model in models['models']:
-                    print(f"    - {model['name']}")
-            else:
-                print("  No models installed. Run: ollama pull qwen2.5:3b")
-        except:
-            print("✗ Ollama service not running")
-            print("  Start with: ollama serve")
-            
-    except ImportError:
+    if ollama is None:
         print("ℹ Ollama not installed (optional)")
         print("  Install with: pip install ollama")
+        return
+    
+    print("✓ Ollama Python module installed")
+    
+    # Check if Ollama service is running
+    models = probe_ollama()
+    if models is None:
+        print("✗ Ollama service not running")
+        print("  Start with: ollama serve")
+        return
+    
+    print(f"✓ Ollama service is running")
+    if models:
+        print(f"  Available models:")
+        for name in models:
+            print(f"    - {name}")
+    else:
+        print("  No models installed. Run: ollama pull qwen2.5:3b")
 
+@buffered_output
 def system_audio_check():
     """Check system audio configuration"""
     print_header("System Audio Configuration")
     
-    system = platform.system()
-    
-    if system == "Linux":
-        # Check ALSA
+    if SYSTEM == "Linux":
+        # Check ALSA: the kernel lists sound cards in procfs, no need to run arecord
         try:
-            result = subprocess.run(['arecord', '-l'], 
-                                  capture_output=True, 
-                                  text=True,
-                                  timeout=2)
-            if result.returncode == 0:
+            with open('/proc/asound/cards') as f:
+                cards = f.read()
+            if cards.strip() and 'no soundcards' not in cards:
                 print("✓ ALSA audio system working")
-                print("\nRecording devices:")
-                print(result.stdout)
+                print("\nSound cards:")
+                print(cards)
             else:
                 print("✗ ALSA issue detected")
-        except:
+        except OSError:
             print("⚠ Could not check ALSA status")
             
-        # Check PulseAudio
-        try:
-            result = subprocess.run(['pactl', 'info'], 
-                                  capture_output=True, 
-                                  text=True,
-                                  timeout=2)
-            if result.returncode == 0:
-                print("✓ PulseAudio is running")
-            else:
-                print("⚠ PulseAudio may not be running")
-        except:
-            pass
+        # Check PulseAudio (or PipeWire's pulse server) by its socket instead of pactl
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR', f"/run/user/{os.getuid()}")
+        if os.path.exists(os.path.join(runtime_dir, 'pulse', 'native')):
+            print("✓ PulseAudio is running")
+        else:
+            print("⚠ PulseAudio may not be running")
             
-    elif system == "Darwin":  # macOS
+    elif SYSTEM == "Darwin":  # macOS
         print("macOS audio system")
         print("If microphone isn't working:")
         print("  1. System Preferences > Security & Privacy > Microphone")
         print("  2. Allow Terminal/Python access to microphone")
         
-    elif system == "Windows":
+    elif SYSTEM == "Windows":
         print("Windows audio system")
         print("If microphone isn't working:")
         print("  1. Settings > Privacy > Microphone")